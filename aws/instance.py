@@ -28,10 +28,13 @@
 # CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
 # ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
 # POSSIBILITY OF SUCH DAMAGE.
+import os
 import time
+import pipes
 import logging
 import boto.ec2
 import fabric.api
+import fabric.contrib.project
 
 class AWSInstance():
     def __init__(self, iconfig, key, pem, group, conn):
@@ -63,6 +66,9 @@ class AWSInstance():
                 if i.id == id:
                     instance = i
 
+            self.id = instance.id
+            self.public_dns = instance.public_dns_name
+
         return instance
 
     def __create_aws_instance(self, key_pair, security_group):
@@ -155,10 +161,35 @@ class AWSInstance():
         while not self.__ssh_is_ready():
             time.sleep(10)
 
-    def run_commands(self, commands):
-        '''Run each of the commands.'''
-        for command in commands:
-            self.execute(command)
+    def sync_files(self, files):
+        '''Sync each local directory to its remote path.'''
+        for local, remote in files.items():
+            self.sync(local, remote)
+
+    def sync(self, local, remote):
+        '''
+        Sync the contents of a local directory to a remote path with rsync.
+        Only files that differ are sent, as compressed block deltas. A remote
+        path starting with ~/ is relative to the SSH user's home directory.
+        '''
+        local = os.path.join(os.path.expanduser(local), '')
+
+        # rsync uses the system ssh binary instead of paramiko. EC2 reuses
+        # public DNS names, so skip the known_hosts checks like paramiko does.
+        ssh_opts = '-o StrictHostKeyChecking=no -o UserKnownHostsFile=/dev/null'
+
+        # Quote both paths for the local shell. --protect-args stops the
+        # remote shell from splitting the remote path again, which also stops
+        # it from expanding a leading ~, so expand that here first.
+        with fabric.api.hide('output'):
+            if remote == '~' or remote.startswith('~/'):
+                remote = fabric.api.run('echo $HOME').strip() + remote[1:]
+
+            fabric.api.run('mkdir -p {0}'.format(pipes.quote(remote)))
+            fabric.contrib.project.rsync_project(pipes.quote(remote),
+                                                 pipes.quote(local),
+                                                 ssh_opts=ssh_opts,
+                                                 extra_opts='--protect-args')
 
     def execute(self, command):
         with fabric.api.hide('output'):
@@ -31,6 +31,7 @@
 # POSSIBILITY OF SUCH DAMAGE.
 import sys
 import json
+import hashlib
 import logging
 import boto.ec2
 
@@ -80,10 +81,50 @@ def start():
     else:
         info('starting instance {0}.'.format(id))
 
+    i = prepare_instance()
+
+    # Files are synced on every start because only changed files are sent.
+    sync_files(i)
+
+    # Only run commands on first run. Allows for stopping and restarting the
+    # machine.
+    if iconfig.get('first_run', True) is True:
+        iconfig['first_run'] = False
+        iconfig['applied'] = []
+        save_config(iconfig_file, iconfig)
+        apply_commands(i)
+    else:
+        info('The "first_run" key is set to false, no commands executed.')
+
+
+def update():
+    '''
+    Run any commands in the configuration file that have not been applied to
+    the instance specified by the instance_id. Commands that were added or
+    changed since the last start or update are run, all others are skipped.
+    If the instance_id is None or the instance no longer exists, then log an
+    error and quit. A new instance is never created.
+    '''
+    id = iconfig.get('id')
+    if (id is not None) and instance_exists(id):
+        info('Updating instance {0}.'.format(id))
+        i = prepare_instance()
+        sync_files(i)
+        apply_commands(i)
+    else:
+        logging.critical('Invalid instance id: {0}.'.format(id))
+
+
+def prepare_instance():
+    '''
+    Get the instance from the configuration, creating or starting it if
+    needed, and save its id and public DNS name. Add any needed rules to the
+    security group and wait until the instance accepts SSH connections.
+    '''
     sg = aws.securitygroup.SecurityGroup(bconfig['security_group'], conn)
     kp = aws.keypair.KeyPair(bconfig['key_pair'], bconfig['ssh_path'], conn)
     i = aws.instance.AWSInstance(iconfig, kp.name, kp.pem, sg.name, conn)
-    if i.status != 'running':
+    if i.status() != 'running':
         i.start()
 
     info('Instance is running, the public DNS name is {0}.'.format(i.public_dns))
@@ -91,8 +132,8 @@ def start():
     # Add the instance id and public DNS name to the configuration and save it.
     iconfig['id'] = i.id
     iconfig['public_dns'] = i.public_dns
-    save_config(iconfig_file, iconfig) 
-    
+    save_config(iconfig_file, iconfig)
+
     rules = iconfig.get('rules', [])
     info('Adding {0} rules to the security group.'.format(len(rules)))
     sg.add_rules(rules)
@@ -100,16 +141,78 @@ def start():
     info('Waiting until instance is ready to receive commands.')
     i.connect_ssh(kp.pem)
 
-    # Only run commands on first run. Allows for stopping and restarting the
-    # machine.
-    if iconfig.get('first_run', True) is True:
-        iconfig['first_run'] = False
+    return i
+
+
+def instance_exists(id):
+    '''Return True if a non-terminated instance with the id exists.'''
+    try:
+        instances = conn.get_only_instances()
+    except boto.exception.EC2ResponseError as e:
+        logging.critical(e.message)
+        raise 'Unable to get AWS instances.'
+
+    return id in [i.id for i in instances if i.state != 'terminated']
+
+
+def sync_files(instance):
+    '''Sync the directories in the files section to the instance.'''
+    files = iconfig.get('files', {})
+    info('Syncing {0} directories.'.format(len(files)))
+    instance.sync_files(files)
+
+
+def command_hashes(commands):
+    '''
+    Return a SHA1 hash for each command in the list. The hash covers the
+    command and how many times it has appeared so far, so repeated commands
+    are tracked as separate steps.
+    '''
+    seen = {}
+    hashes = []
+    for command in commands:
+        seen[command] = seen.get(command, 0) + 1
+        step = u'{0}:{1}'.format(seen[command], command)
+        hashes.append(hashlib.sha1(step.encode('utf-8')).hexdigest())
+
+    return hashes
+
+
+def apply_commands(instance):
+    '''
+    Run each command whose hash is not in the applied list of the instance
+    configuration. The hash is recorded as soon as each command completes, so
+    a failed run can be resumed with the update command. Hashes of commands
+    that were removed from the configuration are dropped at the end. If the
+    instance has already run but has no applied list, every current command
+    is recorded as applied and nothing is run.
+    '''
+    commands = iconfig.get('commands', [])
+    hashes = command_hashes(commands)
+
+    # Instances started before commands were tracked have already run every
+    # command in the configuration, so treat them all as applied.
+    if 'applied' not in iconfig and iconfig.get('first_run', True) is False:
+        info('No applied commands recorded, marking all commands as applied.')
+        iconfig['applied'] = hashes
         save_config(iconfig_file, iconfig)
-        commands = iconfig.get('commands', [])
-        info('Running {0} commands.'.format(len(commands)))
-        i.run_commands(commands)
-    else:
-        info('The "first_run" key is set to false, no commands executed.')
+
+    applied = iconfig.get('applied', [])
+    pending = [(c, h) for c, h in zip(commands, hashes) if h not in applied]
+    removed = [h for h in applied if h not in hashes]
+    if len(removed) > 0:
+        info('{0} applied commands are no longer in the configuration and '
+             'will not be undone.'.format(len(removed)))
+
+    info('Running {0} of {1} commands.'.format(len(pending), len(commands)))
+    for command, h in pending:
+        instance.execute(command)
+        applied.append(h)
+        iconfig['applied'] = applied
+        save_config(iconfig_file, iconfig)
+
+    iconfig['applied'] = hashes
+    save_config(iconfig_file, iconfig)
 
 
 def stop():
@@ -146,9 +249,11 @@ def terminate():
         i = aws.instance.AWSInstance(iconfig, kp.name, kp.pem, sg.name, conn)
 
         # Remove the instance id and public_dns from the configuration data
-        # and set first run back to true. Finally, update the configuration
-        # file.
+        # and set first run back to true. Forget the applied commands since
+        # the next instance will be built from scratch. Finally, update the
+        # configuration file.
         iconfig['first_run'] = True
+        iconfig.pop('applied', None)
         iconfig.pop('id')
         iconfig.pop('public_dns')
         save_config(iconfig_file, iconfig)
@@ -199,7 +304,7 @@ else:
     sys.exit()
 
 # Make sure we have a config file if we need it.
-config_commands = ['start', 'stop', 'terminate']
+config_commands = ['start', 'update', 'stop', 'terminate']
 if (command in config_commands) and (iconfig is None):
     print 'This command requires a configuration file.'
     sys.exit(1)
@@ -212,6 +317,8 @@ if command == 'bootstrap':
     bootstrap()
 elif command == 'start':
     start()
+elif command == 'update':
+    update()
 elif command == 'stop':
     stop()
 elif command == 'terminate':